@@ -14,82 +14,86 @@ to a standard encoding.
 See https://mediterraneoantico.it/wp-content/uploads/2020/05/La-vita-di-Ilaria.pdf
 '''
 
-def convert(c):
-    '''Map Latin transliteration to Coptic characters'''
-    if c == 'a':
-        return 'ⲁ'
-    elif c == 'b':
-        return 'ⲃ'
-    elif c == 'g':
-        return 'ⲅ'
-    elif c == 'd':
-        return 'ⲇ'
-    elif c == 'e':
-        return 'ⲉ'
-    elif c == 'z':
-        return 'ⲍ'
-    elif c == 'H':
-        return 'ⲏ'
-    elif c == 'q':
-        return 'ⲑ'
-    elif c == 'i':
-        return 'ⲓ'
-    elif c == 'k':
-        return 'ⲕ'
-    elif c == 'l':
-        return 'ⲗ'
-    elif c == 'm':
-        return 'ⲙ'
-    elif c == 'n':
-        return 'ⲛ'
-    elif c == 'x':
-        return 'ⲝ'
-    elif c == 'o':
-        return 'ⲟ'
-    elif c == 'p':
-        return 'ⲡ'
-    elif c == 'r':
-        return 'ⲣ'
-    elif c == 's':
-        return 'ⲥ'
-    elif c == 't':
-        return 'ⲧ'
-    elif c == 'u':
-        return 'ⲩ'
-    elif c == 'P':
-        return 'ⲫ'
-    elif c == 'C':
-        return 'ⲭ'
-    elif c == 'T':
-        return 'ⲯ'
-    elif c == 'w':
-        return 'ⲱ'
-    elif c == 'y':
-        return 'ϣ'
-    elif c == 'f':
-        return 'ϥ'
-    elif c == 'h':
-        return 'ϩ'
-    elif c == 'j':
-        return 'ϫ'
-    elif c == 'c':
-        return 'ϭ'
-    elif c == 'Y':
-        return 'ϯ'
+import re
+
+# Map Latin transliteration to Coptic characters.
+TRANSLATION = str.maketrans({
+    'a': 'ⲁ',
+    'b': 'ⲃ',
+    'g': 'ⲅ',
+    'd': 'ⲇ',
+    'e': 'ⲉ',
+    'z': 'ⲍ',
+    'H': 'ⲏ',
+    'q': 'ⲑ',
+    'i': 'ⲓ',
+    'k': 'ⲕ',
+    'l': 'ⲗ',
+    'm': 'ⲙ',
+    'n': 'ⲛ',
+    'x': 'ⲝ',
+    'o': 'ⲟ',
+    'p': 'ⲡ',
+    'r': 'ⲣ',
+    's': 'ⲥ',
+    't': 'ⲧ',
+    'u': 'ⲩ',
+    'P': 'ⲫ',
+    'C': 'ⲭ',
+    'T': 'ⲯ',
+    'w': 'ⲱ',
+    'y': 'ϣ',
+    'f': 'ϥ',
+    'h': 'ϩ',
+    'j': 'ϫ',
+    'c': 'ϭ',
+    'Y': 'ϯ',
     # punctuation
-    elif c == '+':
-        return '\u0304' # combining macron
-    elif c == '.':
-        return '·'
+    '+': '\u0304', # combining macron
+    '.': '·',
     # ligatures
-    elif c == 'E':
-        return 'ⲓ︤ⲥ︥'
-    elif c == 'F':
-        return 'ⲭ︤ⲥ︥'
-    elif c == 'D':
-        return 'ⲡ︤ⲛ︦ⲁ︥'
-    # pass everthing else unchanged
-    return c
+    'E': 'ⲓ︤ⲥ︥',
+    'F': 'ⲭ︤ⲥ︥',
+    'D': 'ⲡ︤ⲛ︦ⲁ︥',
+    # everything else passes through unchanged
+})
+
+# str.translate() only needs to index the table by code point, and
+# a list covering ASCII is cheaper to index than the dict above.
+# Anything past the end raises IndexError and is left unchanged.
+TABLE = [TRANSLATION.get(code, chr(code)) for code in range(128)]
+
+# Split a line into text and (possibly unterminated) annotations.
+SPLIT_RE = re.compile(r'(\([^)]*\)?)')
+
+
+def convert(c):
+    '''Map Latin transliteration to Coptic characters'''
+    return c.translate(TABLE)
+
+
+def transliterate(line, parenthetical=False):
+    '''Convert a line of text, leaving parenthetical annotations alone.
+
+    Annotations may span lines, so the caller passes in whether
+    the previous line ended inside one. Returns the converted text
+    and the same flag for the end of this line.'''
+    coptic = []
+    if parenthetical:
+        # Pass through the remainder of an open annotation.
+        head, close, line = line.partition(')')
+        coptic.append(head + close)
+        if not close:
+            return ''.join(coptic), True
+    # Odd-indexed chunks are annotations, possibly left open.
+    chunks = SPLIT_RE.split(line)
+    for index, chunk in enumerate(chunks):
+        if index % 2:
+            coptic.append(chunk)
+        else:
+            coptic.append(chunk.translate(TABLE))
+    parenthetical = len(chunks) > 1 and not chunks[-2].endswith(')')
+    return ''.join(coptic), parenthetical
 
 
 if __name__ == '__main__':
@@ -102,24 +106,16 @@ if __name__ == '__main__':
     with open(sys.argv[1]) as f:
         # Don't convert parenthetical annotations
         parenthetical = False
-        for line in f.readlines():
+        out = []
+        for line in f:
             if line.startswith('#'):
                 # skip headers/comments
-                print(line)
+                out.append(line)
                 continue
-            coptic = []
-            for char in line:
-                if char == '(':
-                    parenthetical = True
-                    coptic.append(char)
-                elif char == ')':
-                    parenthetical = False
-                    coptic.append(char)
-                elif char == '\n':
-                    continue
-                elif parenthetical:
-                    coptic.append(char)
-                else:
-                    coptic.append(convert(char))
-            coptic = ''.join(coptic)
-            print(coptic)
+            coptic, parenthetical = transliterate(line.replace('\n', ''),
+                                                  parenthetical)
+            out.append(coptic)
+
+    # Write everything at once rather than a line at a time.
+    if out:
+        sys.stdout.write('\n'.join(out) + '\n')
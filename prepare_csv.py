@@ -6,28 +6,54 @@ and mark it up for input into the Coptic Scriptorium ingest tooling.
 '''
 
 import csv
+import functools
+import itertools
+import operator
 import os
+import re
 import unicodedata
+from collections import Counter
+from typing import NamedTuple
 
 import markdown
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
 
-class LineRef:
+# Characters the lints look for.
+COMBINING_MACRON = '\u0304'
+COMBINING_OVERLINE = '\u0305'
+COMBINING_NI = '\u2CEF'
+SOFT_HYPHEN = '\u00AD'
+
+# Match them all at once, so each line needs only one scan.
+MARKS_RE = re.compile(f'[{COMBINING_MACRON}{COMBINING_OVERLINE}'
+                      f'{COMBINING_NI}{SOFT_HYPHEN}.,]')
+# Inline markup in the transcription: manuscript page breaks and sic notes.
+MARKUP_RE = re.compile(r'\*|\(sic\)')
+# Reference, coptic text and note columns of the csv export.
+get_fields = operator.itemgetter(0, 2, 7)
+
+
+class LineRef(NamedTuple):
     '''Represent a `page.line` style reference
 
        This is the scheme used in Drescher's transcription.
        We provide a string representation so it can be printed
-       as normal.'''
-    def __init__(self, page, line):
-        self.page = page
-        self.line = line
+       as normal. References are immutable, so they can be
+       shared freely between lines.'''
+    page: int
+    line: int
 
     def __str__(self):
         return f'{self.page}.{self.line}'
 
     def increment(self):
-        '''Increment the line number'''
-        self.line += 1
+        '''Return a reference to the following line'''
+        return LineRef(self.page, self.line + 1)
 
     @classmethod
     def from_str(cls, string):
@@ -36,165 +62,241 @@ class LineRef:
         return cls(page, line)
 
 
-class Line:
-    '''Represent a line of coptic text with associated reference and notes.'''
-    def __init__(self, ref, coptic, note):
-        self.ref = ref
-        self.coptic = coptic
-        self.note = note
+class Corpus:
+    '''Represent lines of coptic text with associated references and notes.
+
+    The text is stored column-wise as parallel lists, so passes
+    which only look at the coptic text don't touch the rest.'''
+    def __init__(self):
+        self.refs = []
+        self.coptics = []
+        self.notes = []
+
+    def __len__(self):
+        return len(self.coptics)
+
+    def append(self, ref, coptic, note):
+        '''Add a line to the end of the text.'''
+        self.refs.append(ref)
+        self.coptics.append(coptic)
+        self.notes.append(note)
+
+
+def read_rows(infilename):
+    '''Read the reference, coptic and note columns from a csv file.
+
+    Uses the pyarrow parser when it is installed and can handle
+    the file, falling back to the standard library otherwise, or
+    plain string splitting if the file contains no quoted fields.
+    Yields a tuple for each row after the column headings.'''
+    if pacsv:
+        # Keep everything as strings; otherwise references like
+        # 1.10 are inferred to be floating point numbers.
+        columns = ['f0', 'f2', 'f7']
+        read_options = pacsv.ReadOptions(
+            skip_rows=1, autogenerate_column_names=True)
+        parse_options = pacsv.ParseOptions(newlines_in_values=True)
+        convert_options = pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in columns})
+        try:
+            table = pacsv.read_csv(infilename,
+                                   read_options=read_options,
+                                   parse_options=parse_options,
+                                   convert_options=convert_options)
+        except pa.ArrowInvalid:
+            # pyarrow rejects some files the csv module accepts, such
+            # as a header with no rows, or rows with extra fields.
+            # Fall back rather than dropping anything.
+            table = None
+        if table is not None:
+            yield from zip(*(table.column(column).to_pylist()
+                             for column in columns))
+            return
+
+    with open(infilename, newline='', buffering=1<<20) as infile:
+        # Without any quoting, fields can't contain commas or newlines,
+        # so it's enough to split each line instead of using csv.
+        quoted = any('"' in line for line in infile)
+        infile.seek(0)
+        if quoted:
+            reader = csv.reader(infile)
+        else:
+            reader = (line.rstrip('\r\n').split(',') for line in infile)
+        # first row has the column headings
+        header = reader.__next__()
 
-    def __str__(self):
-        return f'{str(self.ref): ^5} : {self.coptic: <62} : {self.note}'
+        yield from map(get_fields, reader)
 
 
-def read_text(infilename):
+def iter_text(infilename):
     '''Read and parse a csv file.
 
-    Returns a list of Line objects representing the text.'''
-    text = []
-    with open(infilename, newline='') as infile:
-        ref = LineRef(0,0)
-        longest = 0
+    Yields a (ref, coptic, note) tuple for each row of the text
+    as it is parsed.'''
+    ref = LineRef(0,0)
+    for string, coptic, note in read_rows(infilename):
+        # Parse the page and line reference.
+        try:
+            newref = LineRef.from_str(string)
+            if newref.page == ref.page and newref.line != ref.line + 1:
+                print(f'Warning: Line numbering off: Found {newref} following {ref}')
+            ref = newref
+        except ValueError:
+            # Otherwise calculate the next expected line number.
+            ref = ref.increment()
 
-        reader = csv.reader(infile)
-        # first row has the column headings
-        header = reader.__next__()
+        yield ref, coptic, note
 
-        for row in reader:
-            coptic = row[2]
-            note = row[7]
-            # Parse the page and line reference.
-            try:
-                newref = LineRef.from_str(row[0])
-                if newref.page == ref.page and newref.line != ref.line + 1:
-                    print(f'Warning: Line numbering off: Found {newref} following {ref}')
-                ref = newref
-            except ValueError:
-                # Otherwise calculate the next expected line number.
-                ref.increment()
-
-            longest = max(longest, len(coptic))
-
-            # Must construct a new LineRef for eac each lime, otherwise
-            # the Line object will hold a refence which updates at the
-            # same time as our local instance.
-            lineref = LineRef(ref.page, ref.line)
-            line = Line(lineref, coptic, note)
-            text.append(line)
 
-    print(f'Longest Coptic line is {longest}')
-    return text
+def read_text(infilename):
+    '''Read and parse a csv file.
 
+    Returns a Corpus object representing the text.'''
+    corpus = Corpus()
+    for ref, coptic, note in iter_text(infilename):
+        corpus.append(ref, coptic, note)
 
-def analyse_chars(text):
-    '''Report a list of unicode characters used in the text.'''
+    longest = max(map(len, corpus.coptics), default=0)
+    print(f'Longest Coptic line is {longest}')
+    return corpus
 
-    chars = set()
-    for line in text:
-        chars.update(set(line.coptic))
 
+def analyse_chars(coptics):
+    '''Report a list of unicode characters used in the text.'''
+    chars = Counter()
+    for coptic in coptics:
+        chars.update(coptic)
+    report_chars(chars)
+
+
+@functools.lru_cache(maxsize=None)
+def describe(key):
+    '''Return a printable label and a name for a unicode character.'''
+    try:
+        name = unicodedata.name(key)
+    except ValueError:
+        name = 'unnamed character'
+    if key == '\n':
+        name = 'newline'
+    elif key == '\t':
+        name = 'tab'
+    if unicodedata.combining(key):
+        label = '\u25CC' + key
+    elif key.isprintable():
+        label = key
+    else:
+        label = ' '
+    return label, name
+
+
+def report_chars(chars):
+    '''Print a table of the characters in a Counter with their frequencies.'''
     print('Characters in the text:')
     keys = list(chars)
     keys.sort()
     for key in keys:
-        try:
-            name = unicodedata.name(key)
-        except ValueError:
-            name = 'unnamed character'
-        if key == '\n':
-            name = 'newline'
-        elif key == '\t':
-            name = 'tab'
-        if unicodedata.combining(key):
-            label = '\u25CC' + key
-        elif key.isprintable():
-            label = key
-        else:
-            label = ' '
-        print(f'  {label}\t{ord(key):04X}\t{name}')
+        label, name = describe(key)
+        print(f'  {label}\t{ord(key):04X}\t{chars[key]:>6}\t{name}')
+
+
+def find_marks(coptic):
+    '''Return a dict mapping each mark in MARKS_RE to its offsets in the line.'''
+    marks = {}
+    for match in MARKS_RE.finditer(coptic):
+        marks.setdefault(match.group(), []).append(match.start())
+    return marks
 
 
-def check_macrons(text):
+def check_macrons(ref, coptic, marks):
     '''Report issues with combining marks.'''
-    for line in text:
-        if '\u0305' in line.coptic:
-            print(f'Error: line {line.ref} contains U+0305 Combining Overbar.')
-            offset = line.coptic.find('\u0305')
-            print(f'  {line.coptic}')
-            print(f'  {" " * offset}^')
-            print('Consider U+0304 Combining Macron instead.\n')
-        if '\u2CEF' in line.coptic:
-            print(f'Error: line {line.ref} contains U+2CEF Combining Ni.')
-            offset = line.coptic.find('\u2CEF')
-            print(f'  {line.coptic}')
-            print(f'  {" " * offset}^')
-            print('Consider U+0304 Combining Macron instead.\n')
-        if line.coptic.count('\u0304') > 1:
-            # Find the indices of all the overbar characters.
-            bars = [line.coptic.index('\u0304')]
-            while True:
-                match = line.coptic.find('\u0304', bars[-1] + 1)
-                if match < 0:
-                    # No more matches in the string
-                    break
-                bars.append(match)
-            # Look for adjacent examples.
-            last = -2
-            for match in bars:
-                if match == last + 2:
-                    print(f'Warning: line {line.ref} contains macrons on adjacent characters.')
-                    print(f'  {line.coptic}')
-                    print(f'  {" " * last}^^')
-                    print('Most publications recommend Half/Conjoining Macrons U+FE24, [U+FE26,] U+FE25.\n')
-                last = match
-
-
-def check_punctuation(text):
+    if COMBINING_OVERLINE in marks:
+        offset = marks[COMBINING_OVERLINE][0]
+        print(f'Error: line {ref} contains U+0305 Combining Overbar.')
+        print(f'  {coptic}')
+        print(f'  {" " * offset}^')
+        print('Consider U+0304 Combining Macron instead.\n')
+    if COMBINING_NI in marks:
+        offset = marks[COMBINING_NI][0]
+        print(f'Error: line {ref} contains U+2CEF Combining Ni.')
+        print(f'  {coptic}')
+        print(f'  {" " * offset}^')
+        print('Consider U+0304 Combining Macron instead.\n')
+    # Indices of all the overbar characters.
+    bars = marks.get(COMBINING_MACRON, [])
+    if len(bars) > 1:
+        # Look for adjacent examples.
+        last = -2
+        for match in bars:
+            if match == last + 2:
+                print(f'Warning: line {ref} contains macrons on adjacent characters.')
+                print(f'  {coptic}')
+                print(f'  {" " * last}^^')
+                print('Most publications recommend Half/Conjoining Macrons U+FE24, [U+FE26,] U+FE25.\n')
+            last = match
+
+
+def check_punctuation(ref, coptic, marks):
     '''Report issues with punctuation marks.'''
-    for line in text:
-        if '.' in line.coptic:
-            print(f'Error: line {line.ref} contains a period.')
-            offset = line.coptic.find('.')
-            print(f'  {line.coptic}')
-            print(f'  {" " * offset}^')
-            print('Consider U+00B7 Middle Dot instead.\n')
-        elif ',' in line.coptic:
-            print(f'Error: line {line.ref} contains a comma.')
-            offset = line.coptic.find('.')
-            print(f'  {line.coptic}')
-            print(f'  {" " * offset}^')
-            print('This is not native Coptic punctuation.\n')
-
-
-def check_whitespace(text):
+    if '.' in marks:
+        offset = marks['.'][0]
+        print(f'Error: line {ref} contains a period.')
+        print(f'  {coptic}')
+        print(f'  {" " * offset}^')
+        print('Consider U+00B7 Middle Dot instead.\n')
+        return
+    if ',' in marks:
+        offset = marks[','][0]
+        print(f'Error: line {ref} contains a comma.')
+        print(f'  {coptic}')
+        print(f'  {" " * offset}^')
+        print('This is not native Coptic punctuation.\n')
+
+
+def check_whitespace(ref, coptic):
     '''Report issues with leading/trailing whitespace.'''
-    for line in text:
-        if line.coptic != str.strip(line.coptic):
-            leading = line.coptic[0].isspace()
-            trailing = line.coptic[:1].isspace()
-            if line.coptic.endswith('\n'):
-                print(f'Warning: line {line.ref} contains an extra newline.')
-                print(f'  "...{line.coptic[-10:-1]}\\n"')
-            elif leading and trailing:
-                print(f'Warning: line {line.ref} contains both leading and trailing whitespace.')
-                print(f'  "{line.coptic[:5]}...{line.coptic[-5:]}"')
-            elif leading:
-                print(f'Warning: line {line.ref} contains leading whitespace.')
-                print(f'  "{line.coptic[:10]}..."')
-            else:
-                print(f'Warning: line {line.ref} contains trailing whitespace.')
-                print(f'  "...{line.coptic[-10:]}"')
+    if coptic != str.strip(coptic):
+        leading = coptic[0].isspace()
+        trailing = coptic[:1].isspace()
+        if coptic.endswith('\n'):
+            print(f'Warning: line {ref} contains an extra newline.')
+            print(f'  "...{coptic[-10:-1]}\\n"')
+        elif leading and trailing:
+            print(f'Warning: line {ref} contains both leading and trailing whitespace.')
+            print(f'  "{coptic[:5]}...{coptic[-5:]}"')
+        elif leading:
+            print(f'Warning: line {ref} contains leading whitespace.')
+            print(f'  "{coptic[:10]}..."')
+        else:
+            print(f'Warning: line {ref} contains trailing whitespace.')
+            print(f'  "...{coptic[-10:]}"')
 
 
-def check_continuations(text):
+def check_continuations(ref, coptic, marks):
     '''Report issues with linebreaks and continuation marks.'''
-    for line in text:
-        if '\u00AD' in line.coptic:
-            print(f'Warning: line {line.ref} contains a soft-hyphen character.')
-            offset = line.coptic.index('\u00AD')
-            print(f'  {line.coptic}')
-            print(f'  {" " * offset}^')
-            print('  Tools may not understand this character.')
+    if SOFT_HYPHEN in marks:
+        offset = marks[SOFT_HYPHEN][0]
+        print(f'Warning: line {ref} contains a soft-hyphen character.')
+        print(f'  {coptic}')
+        print(f'  {" " * offset}^')
+        print('  Tools may not understand this character.')
+
+
+def lint_text(corpus):
+    '''Run all the checks over the text in a single pass.
+
+    Problems are reported line by line, followed by a table
+    of the characters used in the text.'''
+    chars = Counter()
+    for ref, coptic in zip(corpus.refs, corpus.coptics):
+        chars.update(coptic)
+        marks = find_marks(coptic)
+        check_macrons(ref, coptic, marks)
+        check_punctuation(ref, coptic, marks)
+        check_whitespace(ref, coptic)
+        check_continuations(ref, coptic, marks)
+    report_chars(chars)
+
 
 def consolidate_whitespace(coptic):
     '''Replace successive whitespace characters with a single space.'''
@@ -214,29 +316,32 @@ def consolidate_whitespace(coptic):
     return ''.join(result)
 
 
-def construct_sgml(text):
-    '''Construct an SGML fragment representing the text.
+def sgml_lines(corpus):
+    '''Generate the lines of an SGML fragment representing the text.
 
     Use TEI tags to prepare a partial tagged document for
     submission to the Coptic Scriptorium publication tools.
     '''
-    sgml = '<!DOCTYPE SGML>\n'
+    yield '<!DOCTYPE SGML>\n'
     page = None
-    manuscript_page = 198
-    sgml += f'<pb ed="M.583" n="{manuscript_page}">\n'
-    manuscript_page += 1
-    for line in text:
-        if line.ref.page != page:
+    manuscript_pages = itertools.count(198)
+    yield f'<pb ed="M.583" n="{next(manuscript_pages)}">\n'
+
+    def markup(match):
+        '''Replace inline markup with the corresponding tag.'''
+        if match.group() == '*':
+            return f'<pb ed="M.583" n="{next(manuscript_pages)}">'
+        # Drop Drescher's sic annotations.
+        return ''
+
+    for ref, coptic in zip(corpus.refs, corpus.coptics):
+        if ref.page != page:
             # Mark up page changes recorded in the LineRef.
-            sgml += f'<pb ed="Drescher" n="{line.ref.page}">\n'
-            page = line.ref.page
+            yield f'<pb ed="Drescher" n="{ref.page}">\n'
+            page = ref.page
 
         # Convert any inline markup
-        coptic = line.coptic.strip()
-        if '*' in coptic:
-            coptic = coptic.replace('*', f'<pb ed="M.583" n="{manuscript_page}">')
-            manuscript_page += 1
-        coptic = coptic.replace('(sic)', '')
+        coptic = MARKUP_RE.sub(markup, coptic.strip())
         coptic = coptic.strip()
         # AZ indicated multiple whitespace characters confused the tagger.
         coptic = consolidate_whitespace(coptic)
@@ -250,33 +355,29 @@ def construct_sgml(text):
             coptic += ('_')
 
         # Write out the line of text.
-        sgml += f'<lb ed="Drescher" n="{line.ref.line}">{coptic}\n'
-
-    return sgml
+        yield f'<lb ed="Drescher" n="{ref.line}">{coptic}\n'
 
 
-def construct_markdown(text):
-    '''Construct a markdown version of the text.'''
+def markdown_lines(corpus):
+    '''Generate the lines of a markdown version of the text.'''
 
     # format lines in a table, since markdown doesn't support <ol> with
     # our multilevel reference line numbers.
     headings = ('ref', 'coptic text')
     headings = list(map(lambda head: ' ' + head + ' ', headings))
-    md = '|'.join(headings) + '\n'
     dividers = list(map(lambda head: '-' * len(head), headings))
-    md += '|'.join(dividers) + '\n'
+    yield '|'.join(headings) + '\n'
+    yield '|'.join(dividers) + '\n'
+    for ref, coptic in zip(corpus.refs, corpus.coptics):
+        yield f'{ref}|{str.strip(coptic)}\n'
 
-    for line in text:
-        md += f'{line.ref}|{str.strip(line.coptic)}\n'
 
-    return md
-
-
-def construct_html(text):
-    '''Construct an html version of the text.'''
+def html_lines(corpus):
+    '''Generate the pieces of an html version of the text.'''
 
     # Construct a markdown version, and render that with a custom preamble.
-    md = construct_markdown(text)
+    # The renderer needs the whole document at once.
+    md = ''.join(markdown_lines(corpus))
     render = markdown.markdown(md, extensions=['tables'])
 
     header = '''<!DOCTYPE html>
@@ -310,33 +411,28 @@ tr td {
 
 '''
     footer = '''</body>\n</html>\n'''
-    html = header + render + footer
-
-    return html
+    yield header
+    yield render
+    yield footer
 
 
 def handle_file(filename):
     '''Read a csv file, perform lints and write out a formatted version.'''
-    text = read_text(filename)
-    analyse_chars(text)
-    check_macrons(text)
-    check_punctuation(text)
-    check_whitespace(text)
-    check_continuations(text)
+    corpus = read_text(filename)
+    lint_text(corpus)
 
     sgml_filename = os.path.splitext(filename)[0] + '.sgml'
-    sgml = construct_sgml(text)
     print(f'Writing text to {sgml_filename}')
     with open(sgml_filename, 'w') as outfile:
-        outfile.write(sgml)
-    sgml_text = [Line(None, line, None) for line in sgml.split('\n')]
-    analyse_chars(sgml_text)
+        outfile.writelines(sgml_lines(corpus))
+    # Report on what was written rather than keeping a copy in memory.
+    with open(sgml_filename) as infile:
+        analyse_chars(line.rstrip('\n') for line in infile)
 
     html_filename = os.path.splitext(filename)[0] + '.html'
-    html = construct_html(text)
     print(f'Writing text to {html_filename}')
     with open(html_filename, 'w') as outfile:
-        outfile.write(html)
+        outfile.writelines(html_lines(corpus))
 
 
 if __name__ == '__main__':